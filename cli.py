@@ -6,14 +6,17 @@ import re
 import shutil
 import sys
 import time
-from typing import Callable, Iterator, Optional, Protocol, Tuple
+from typing import Callable, Dict, Iterator, Optional, Protocol, Tuple
 
 from barriers import random_barriers
-from character import Character, default_human, default_zombie
+from character import Character, LifeState, default_human, default_zombie
+from grid import GridIndex
 from population import Population
 from renderer import Renderer, RenderEmpty
+from roster import IndexBuilder
 from space import Area, Point
 import tracing
+from tree import PartitionTree
 from world import Builder, Tick
 
 
@@ -51,6 +54,12 @@ ZOMBIE_CHANCE = float(environ.get("ZOMBIE_CHANCE", 0.2))
 BARRIERS = int(environ.get("BARRIERS", 20))
 TICK = float(environ.get("TICK", 0.1))
 
+INDEX_BACKENDS: Dict[str, IndexBuilder[Character, LifeState]] = {
+    "tree": PartitionTree.build,
+    "grid": GridIndex.build,
+}
+INDEX_BACKEND = INDEX_BACKENDS[environ.get("INDEX", "tree")]
+
 max_age_str = environ.get("MAX_AGE")
 MAX_AGE = int(max_age_str) if max_age_str else None
 
@@ -89,7 +98,7 @@ if __name__ == "__main__":
 
     empty = RenderEmpty.SPACE if world_size_auto and barriers else RenderEmpty.DOT
 
-    builder = Builder(world_area, population, barriers)
+    builder = Builder(world_area, population, barriers, backend=INDEX_BACKEND)
     roster = builder.roster
     renderer = Renderer(roster, barriers, empty=empty)
 
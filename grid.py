@@ -0,0 +1,396 @@
+from heapq import heappush, heapreplace
+from itertools import chain
+import math
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from space import Area, Point
+from tree import UNSET, Change, Edit, Match, Unset, net_changes
+
+ValueType = TypeVar("ValueType")
+PartitionKeyType = TypeVar("PartitionKeyType", bound=Hashable)
+
+Cell = Tuple[int, int]
+Bucket = Dict[Point, ValueType]
+Grid = Dict[Cell, Bucket[ValueType]]
+Candidate = Tuple[int, int, int, Point, ValueType]
+
+
+class GridIndex(Generic[PartitionKeyType, ValueType]):
+    """A spatial hash that maps 2-dimensional positions to partitioned values.
+
+    This is an alternative to PartitionTree, with the same interface. The area is
+    divided into square cells of `cell_size` points along each side, and each
+    partition keeps a dict of the non-empty cells in it. For worlds with a roughly even
+    density of characters, looking up a small area or a nearby point only needs to
+    look at a handful of cells, rather than descending a tree.
+
+    Like PartitionTree, a GridIndex is immutable: `set`, `unset` and `apply` return a
+    new index, copying only the cells they change.
+    """
+
+    DEFAULT_CELL_SIZE = 8
+
+    @classmethod
+    def build(
+        cls,
+        area: Area,
+        partition_func: Callable[[ValueType], PartitionKeyType],
+        positions: Optional[Dict[Point, ValueType]] = None,
+        cell_size: int = DEFAULT_CELL_SIZE,
+    ) -> "GridIndex[PartitionKeyType, ValueType]":
+        if cell_size < 1:
+            raise ValueError(f"Cannot have a cell size of {cell_size}")
+
+        index: GridIndex[PartitionKeyType, ValueType] = GridIndex(
+            area, partition_func, cell_size, {}, 0
+        )
+        grids = index._grids
+        for point, value in (positions or {}).items():
+            if point not in area:
+                raise ValueError(f"{point} not in index area")
+            grid = grids.setdefault(partition_func(value), {})
+            grid.setdefault(index._cell(point), {})[point] = value
+        index._size = len(positions or {})
+        return index
+
+    def __init__(
+        self,
+        area: Area,
+        partition_func: Callable[[ValueType], PartitionKeyType],
+        cell_size: int,
+        grids: Dict[PartitionKeyType, Grid[ValueType]],
+        size: int,
+    ):
+        self._area = area
+        self._partition_func = partition_func
+        self._cell_size = cell_size
+        self._grids = grids
+        self._size = size
+
+    def __repr__(self) -> str:
+        return f"GridIndex({self._area}, {self._cell_size}, {self._grids})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GridIndex):
+            return False
+        return self._area == other._area and dict(self.items()) == dict(other.items())
+
+    def _cell(self, point: Point) -> Cell:
+        return (
+            (point.x - self._area._lower.x) // self._cell_size,
+            (point.y - self._area._lower.y) // self._cell_size,
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, position: Point) -> bool:
+        return self.get(position) is not None
+
+    def __getitem__(self, position: Point) -> ValueType:
+        if (value := self.get(position)) is not None:
+            return value
+        else:
+            raise KeyError(position)
+
+    def get(self, position: Point) -> Optional[ValueType]:
+        cell = self._cell(position)
+        for grid in self._grids.values():
+            bucket = grid.get(cell)
+            if bucket is not None and (value := bucket.get(position)) is not None:
+                return value
+        else:
+            return None
+
+    def items(self) -> Iterable[Tuple[Point, ValueType]]:
+        return chain.from_iterable(
+            bucket.items() for grid in self._grids.values() for bucket in grid.values()
+        )
+
+    def items_in(self, area: Area) -> Set[Match[ValueType]]:
+        area = area.intersect(self._area)
+        if area.width <= 0 or area.height <= 0:
+            return set()
+
+        lower = self._cell(area._lower)
+        upper = self._cell(Point(area._upper.x - 1, area._upper.y - 1))
+
+        matches: Set[Match[ValueType]] = set()
+        for grid in self._grids.values():
+            for bucket in _buckets_between(grid, lower, upper):
+                matches.update(Match(p, v) for p, v in bucket.items() if p in area)
+        return matches
+
+    def nearest_to(
+        self, origin: Point, key: PartitionKeyType
+    ) -> Optional[Match[ValueType]]:
+        nearest = self.nearest_k(origin, 1, key)
+        return nearest[0] if nearest else None
+
+    def nearest_k(
+        self, origin: Point, k: int, key: PartitionKeyType
+    ) -> List[Match[ValueType]]:
+        """Return the `k` nearest entries with a given key, nearest first.
+
+        This searches outwards from the origin's cell one ring of cells at a time,
+        stopping once no cell in the next ring could hold anything nearer than the
+        `k`th best entry found so far. As with PartitionTree, an entry at the origin
+        itself is left out.
+        """
+        grid = self._grids.get(key)
+        if not grid or k <= 0:
+            return []
+
+        nearest: List[Candidate[ValueType]] = []
+        for bucket in self._buckets_outwards(grid, origin, k, nearest):
+            for pos, value in bucket.items():
+                dx = pos.x - origin.x
+                dy = pos.y - origin.y
+                distance = dx * dx + dy * dy
+                if not distance:
+                    continue
+                if len(nearest) < k:
+                    heappush(nearest, (-distance, pos.x, pos.y, pos, value))
+                elif distance < -nearest[0][0]:
+                    heapreplace(nearest, (-distance, pos.x, pos.y, pos, value))
+
+        nearest.sort(key=lambda c: (-c[0], c[1], c[2]))
+        return [Match(point, value) for _, _, _, point, value in nearest]
+
+    def _buckets_outwards(
+        self,
+        grid: Grid[ValueType],
+        origin: Point,
+        k: int,
+        nearest: List[Candidate[ValueType]],
+    ) -> Iterator[Bucket[ValueType]]:
+        centre_x, centre_y = self._cell(origin)
+        last_x, last_y = self._cell(
+            Point(self._area._upper.x - 1, self._area._upper.y - 1)
+        )
+        max_ring = max(
+            abs(centre_x), abs(last_x - centre_x), abs(centre_y), abs(last_y - centre_y)
+        )
+
+        for ring in range(max_ring + 1):
+            # Every point in a cell `ring` cells away is at least this far away
+            closest = max((ring - 1) * self._cell_size + 1, 0)
+            if len(nearest) >= k and closest * closest > -nearest[0][0]:
+                return
+
+            if 8 * ring > len(grid):
+                # Looking at every cell in this ring would take longer than looking at
+                # all the remaining non-empty cells directly
+                for (cell_x, cell_y), bucket in grid.items():
+                    if max(abs(cell_x - centre_x), abs(cell_y - centre_y)) >= ring:
+                        yield bucket
+                return
+
+            for cell in _ring(centre_x, centre_y, ring):
+                if cell in grid:
+                    yield grid[cell]
+
+    def within(
+        self, origin: Point, radius: float, key: PartitionKeyType
+    ) -> List[Match[ValueType]]:
+        grid = self._grids.get(key)
+        if not grid or radius < 0:
+            return []
+
+        reach = math.floor(radius)
+        lower = self._cell(Point(origin.x - reach, origin.y - reach))
+        upper = self._cell(Point(origin.x + reach, origin.y + reach))
+        max_distance = radius * radius
+
+        nearby = []
+        for bucket in _buckets_between(grid, lower, upper):
+            for pos, value in bucket.items():
+                dx = pos.x - origin.x
+                dy = pos.y - origin.y
+                distance = dx * dx + dy * dy
+                if distance and distance <= max_distance:
+                    nearby.append((distance, pos, value))
+
+        nearby.sort(key=lambda n: (n[0], n[1].x, n[1].y))
+        return [Match(point, value) for _, point, value in nearby]
+
+    def set(
+        self, position: Point, value: ValueType
+    ) -> "GridIndex[PartitionKeyType, ValueType]":
+        return self._with_changes({position: value})
+
+    def unset(self, position: Point) -> "GridIndex[PartitionKeyType, ValueType]":
+        if position not in self:
+            raise KeyError(position)
+        return self._with_changes({position: UNSET})
+
+    def apply(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> "GridIndex[PartitionKeyType, ValueType]":
+        changes = net_changes(edits, self.get)
+        return self._with_changes(changes)
+
+    def _with_changes(
+        self, changes: Dict[Point, Change[ValueType]]
+    ) -> "GridIndex[PartitionKeyType, ValueType]":
+        if not changes:
+            return self
+        index = GridIndex(
+            self._area,
+            self._partition_func,
+            self._cell_size,
+            self._grids.copy(),
+            self._size,
+        )
+        index._write(changes, set(), set())
+        return index
+
+    def _write(
+        self,
+        changes: Dict[Point, Change[ValueType]],
+        owned_grids: Set[PartitionKeyType],
+        owned_buckets: Set[Tuple[PartitionKeyType, Cell]],
+    ) -> None:
+        """Apply changes to this index's grids in place.
+
+        Grids and buckets are shared with other indexes unless they're listed as owned,
+        so the first change to any of them replaces it with a copy.
+        """
+
+        def bucket_for_write(key: PartitionKeyType, cell: Cell) -> Bucket[ValueType]:
+            if key not in owned_grids:
+                self._grids[key] = self._grids.get(key, {}).copy()
+                owned_grids.add(key)
+            grid = self._grids[key]
+            if (key, cell) not in owned_buckets:
+                grid[cell] = grid.get(cell, {}).copy()
+                owned_buckets.add((key, cell))
+            return grid[cell]
+
+        for point, change in changes.items():
+            if point not in self._area:
+                raise ValueError(f"{point} not in index area")
+            cell = self._cell(point)
+            for key, grid in self._grids.items():
+                if point in grid.get(cell, {}):
+                    bucket = bucket_for_write(key, cell)
+                    del bucket[point]
+                    if not bucket:
+                        del self._grids[key][cell]
+                        owned_buckets.discard((key, cell))
+                    self._size -= 1
+                    break
+            if not isinstance(change, Unset):
+                bucket_for_write(self._partition_func(change), cell)[point] = change
+                self._size += 1
+
+    def mutable(self) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        return MutableGridIndex(
+            self._area, self._partition_func, self._cell_size, self._grids, self._size
+        )
+
+
+class MutableGridIndex(GridIndex[PartitionKeyType, ValueType]):
+    """A GridIndex whose `set`, `unset` and `apply` methods change it in place.
+
+    As with MutablePartitionTree, this copies each grid and cell the first time it
+    changes it, so the GridIndex it was created from is left alone.
+    """
+
+    def __init__(
+        self,
+        area: Area,
+        partition_func: Callable[[ValueType], PartitionKeyType],
+        cell_size: int,
+        grids: Dict[PartitionKeyType, Grid[ValueType]],
+        size: int,
+    ):
+        super().__init__(area, partition_func, cell_size, grids.copy(), size)
+        self._owned_grids: Set[PartitionKeyType] = set()
+        self._owned_buckets: Set[Tuple[PartitionKeyType, Cell]] = set()
+
+    def _with_changes(
+        self, changes: Dict[Point, Change[ValueType]]
+    ) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        self._write(changes, self._owned_grids, self._owned_buckets)
+        return self
+
+    def set(
+        self, position: Point, value: ValueType
+    ) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        return self._with_changes({position: value})
+
+    def unset(self, position: Point) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        if position not in self:
+            raise KeyError(position)
+        return self._with_changes({position: UNSET})
+
+    def apply(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        changes = net_changes(edits, self.get)
+        return self._with_changes(changes)
+
+    def mutable(self) -> "MutableGridIndex[PartitionKeyType, ValueType]":
+        return self.snapshot().mutable()
+
+    def snapshot(self) -> GridIndex[PartitionKeyType, ValueType]:
+        """Return an immutable GridIndex with this index's current entries.
+
+        The snapshot takes over this index's grids, and this index gives up ownership
+        of all of them, so any later changes copy them first.
+        """
+        snapshot = GridIndex(
+            self._area, self._partition_func, self._cell_size, self._grids, self._size
+        )
+        self._grids = self._grids.copy()
+        self._owned_grids = set()
+        self._owned_buckets = set()
+        return snapshot
+
+
+def _buckets_between(
+    grid: Grid[ValueType], lower: Cell, upper: Cell
+) -> Iterable[Bucket[ValueType]]:
+    """Iterate over the non-empty cells between two corner cells, inclusive."""
+    lower_x, lower_y = lower
+    upper_x, upper_y = upper
+    if (upper_x - lower_x + 1) * (upper_y - lower_y + 1) > len(grid):
+        # It's quicker to check every non-empty cell than every cell in range
+        return (
+            bucket
+            for (cell_x, cell_y), bucket in grid.items()
+            if lower_x <= cell_x <= upper_x and lower_y <= cell_y <= upper_y
+        )
+    return (
+        grid[(cell_x, cell_y)]
+        for cell_y in range(lower_y, upper_y + 1)
+        for cell_x in range(lower_x, upper_x + 1)
+        if (cell_x, cell_y) in grid
+    )
+
+
+def _ring(centre_x: int, centre_y: int, ring: int) -> Iterator[Cell]:
+    """Iterate over the cells exactly `ring` cells away from a centre cell."""
+    if ring == 0:
+        yield (centre_x, centre_y)
+        return
+
+    for dx in range(-ring, ring + 1):
+        yield (centre_x + dx, centre_y - ring)
+        yield (centre_x + dx, centre_y + ring)
+    for dy in range(-ring + 1, ring):
+        yield (centre_x - ring, centre_y + dy)
+        yield (centre_x + ring, centre_y + dy)
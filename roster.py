@@ -11,6 +11,7 @@ from typing import (
     Hashable,
     Iterable,
     Iterator,
+    List,
     Mapping,
     Optional,
     Protocol,
@@ -21,7 +22,7 @@ from typing import (
 
 from barriers import Barriers
 from space import Area, BoundingBox, Point, Vector
-from tree import PartitionTree
+from tree import MoveEdit, MutableSpatialIndex, PartitionTree, SetEdit, SpatialIndex
 
 CharacterType = TypeVar("CharacterType")
 PartitionKeyType = TypeVar("PartitionKeyType", bound=Hashable)
@@ -33,6 +34,15 @@ class Match(Generic[CharacterType]):
     character: CharacterType
 
 
+# Builds the index a Roster uses to look characters up by position, given the roster's
+# area, partition function and starting positions. PartitionTree.build and
+# GridIndex.build both fit the bill.
+IndexBuilder = Callable[
+    [Area, Callable[[CharacterType], PartitionKeyType], Dict[Point, CharacterType]],
+    SpatialIndex[PartitionKeyType, CharacterType],
+]
+
+
 def no_partition(character: Any) -> Tuple[()]:
     return ()
 
@@ -40,10 +50,13 @@ def no_partition(character: Any) -> Tuple[()]:
 class Roster(Generic[CharacterType, PartitionKeyType]):
     @classmethod
     def for_mapping(
-        cls, character_positions: Mapping[Point, CharacterType], area: Area
+        cls,
+        character_positions: Mapping[Point, CharacterType],
+        area: Area,
+        backend: "IndexBuilder[CharacterType, Tuple[()]]" = PartitionTree.build,
     ) -> "Roster[CharacterType, Tuple[()]]":
 
-        return Roster.partitioned(character_positions, area, no_partition)
+        return Roster.partitioned(character_positions, area, no_partition, backend)
 
     @classmethod
     def partitioned(
@@ -51,24 +64,26 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
         character_positions: Mapping[Point, CharacterType],
         area: Area,
         partition_func: Callable[[CharacterType], PartitionKeyType],
+        backend: "IndexBuilder[CharacterType, PartitionKeyType]" = PartitionTree.build,
     ) -> "Roster[CharacterType, PartitionKeyType]":
+        """Build a Roster whose characters are partitioned by `partition_func`.
 
+        The `backend` argument chooses the kind of index used to look up characters by
+        position: PartitionTree.build by default, or GridIndex.build for worlds where
+        characters are spread out fairly evenly.
+        """
         characters: Set[CharacterType] = set()
-        positions: PartitionTree[PartitionKeyType, CharacterType] = PartitionTree.build(
-            area, partition_func
-        )
 
         for position, character in character_positions.items():
             if position not in area:
                 raise ValueError(f"{position} is not in the world area")
-            if position in positions:
-                raise ValueError(f"Multiple characters at position {position}")
             if character in characters:
                 raise ValueError(f"Character {character} in multiple places")
 
-            positions = positions.set(position, character)
             characters.add(character)
 
+        positions = backend(area, partition_func, dict(character_positions))
+
         return Roster(area=area, positions=positions, characters=characters)
 
     def __init__(
@@ -76,7 +91,7 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
         *,
         area: Area,
         characters: Set[CharacterType],
-        positions: PartitionTree[PartitionKeyType, CharacterType],
+        positions: SpatialIndex[PartitionKeyType, CharacterType],
     ):
         self._area = area
         self._characters = characters
@@ -109,6 +124,30 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
         else:
             return None
 
+    def nearest_k(
+        self,
+        origin: Point,
+        k: int,
+        *,
+        key: PartitionKeyType,
+    ) -> List[Match[CharacterType]]:
+        return [
+            Match(position=m.point, character=m.value)
+            for m in self._positions.nearest_k(origin, k, key=key)
+        ]
+
+    def within(
+        self,
+        origin: Point,
+        radius: float,
+        *,
+        key: PartitionKeyType,
+    ) -> List[Match[CharacterType]]:
+        return [
+            Match(position=m.point, character=m.value)
+            for m in self._positions.within(origin, radius, key=key)
+        ]
+
     def move_character(
         self, old_position: Point, new_position: Point
     ) -> "Roster[CharacterType, PartitionKeyType]":
@@ -119,12 +158,11 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
             raise ValueError(f"Attempt to move to occupied position {new_position}")
 
         try:
-            character = self._positions[old_position]
+            positions = self._positions.apply([MoveEdit(old_position, new_position)])
         except KeyError:
             raise ValueError(f"Attempt to move from unoccupied position {old_position}")
 
-        positions = self._positions.unset(old_position).set(new_position, character)
-        return Roster(area=self._area, characters=self._characters, positions=positions)
+        return self._updated(positions, self._characters)
 
     def change_character(
         self, position: Point, change: Callable[[CharacterType], CharacterType]
@@ -137,11 +175,31 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
             )
 
         new_character = change(old_character)
-        positions = self._positions.unset(position).set(position, new_character)
+        positions = self._positions.apply([SetEdit(position, new_character)])
 
-        new_characters = self._characters - set([old_character]) | set([new_character])
+        new_characters = self._replace_character(old_character, new_character)
 
-        return Roster(area=self._area, characters=new_characters, positions=positions)
+        return self._updated(positions, new_characters)
+
+    def _updated(
+        self,
+        positions: SpatialIndex[PartitionKeyType, CharacterType],
+        characters: Set[CharacterType],
+    ) -> "Roster[CharacterType, PartitionKeyType]":
+        return Roster(area=self._area, characters=characters, positions=positions)
+
+    def _replace_character(
+        self, old_character: CharacterType, new_character: CharacterType
+    ) -> Set[CharacterType]:
+        return self._characters - set([old_character]) | set([new_character])
+
+    def mutable(self) -> "MutableRoster[CharacterType, PartitionKeyType]":
+        """Return a MutableRoster starting out with the same characters as this one."""
+        return MutableRoster(
+            area=self._area,
+            characters=self._characters,
+            positions=self._positions.mutable(),
+        )
 
     def __contains__(self, character: CharacterType) -> bool:
         return character in self._characters
@@ -159,6 +217,57 @@ class Roster(Generic[CharacterType, PartitionKeyType]):
         return self._positions == other._positions
 
 
+class MutableRoster(Roster[CharacterType, PartitionKeyType]):
+    """A Roster that updates itself in place.
+
+    Within a single tick, every action builds on the result of the last one, so there's
+    no need to keep each intermediate Roster around. The `move_character` and
+    `change_character` methods of a MutableRoster change it in place and return the
+    same object, which avoids copying the index for every action. Call `snapshot` to get
+    an ordinary, immutable Roster of the current state.
+    """
+
+    def __init__(
+        self,
+        *,
+        area: Area,
+        characters: Set[CharacterType],
+        positions: MutableSpatialIndex[PartitionKeyType, CharacterType],
+    ):
+        super().__init__(area=area, characters=characters, positions=positions)
+        self._mutable_positions = positions
+        # The characters set may be shared with an immutable Roster, so we copy it
+        # before the first change to it
+        self._characters_shared = True
+
+    def _updated(
+        self,
+        positions: SpatialIndex[PartitionKeyType, CharacterType],
+        characters: Set[CharacterType],
+    ) -> "MutableRoster[CharacterType, PartitionKeyType]":
+        assert positions is self._mutable_positions
+        self._characters = characters
+        return self
+
+    def _replace_character(
+        self, old_character: CharacterType, new_character: CharacterType
+    ) -> Set[CharacterType]:
+        if self._characters_shared:
+            self._characters = set(self._characters)
+            self._characters_shared = False
+        self._characters.discard(old_character)
+        self._characters.add(new_character)
+        return self._characters
+
+    def snapshot(self) -> Roster[CharacterType, PartitionKeyType]:
+        self._characters_shared = True
+        return Roster(
+            area=self._area,
+            characters=self._characters,
+            positions=self._mutable_positions.snapshot(),
+        )
+
+
 class Viewpoint(Generic[PartitionKeyType]):
     def __init__(
         self,
@@ -187,6 +296,16 @@ class Viewpoint(Generic[PartitionKeyType]):
         else:
             return None
 
+    def nearest_k(self, vector: Vector, k: int, key: PartitionKeyType) -> List[Vector]:
+        nearest = self._roster.nearest_k(self._origin + vector, k, key=key)
+        return [match.position - self._origin for match in nearest]
+
+    def within(
+        self, vector: Vector, radius: float, key: PartitionKeyType
+    ) -> List[Vector]:
+        nearby = self._roster.within(self._origin + vector, radius, key=key)
+        return [match.position - self._origin for match in nearby]
+
 
 @attr.s(auto_attribs=True, frozen=True)
 class Move(Generic[CharacterType]):
@@ -39,12 +39,18 @@ class Area:
         return self._upper.y - self._lower.y
 
     def distance_from(self, point: Point) -> float:
-        x = min(point.x, self._upper.x)
-        x = max(x, self._lower.x)
-        y = min(point.y, self._upper.y)
-        y = max(y, self._lower.y)
-        best_point = Point(x, y)
-        return (best_point - point).distance
+        return math.sqrt(self.squared_distance_from(point))
+
+    def squared_distance_from(self, point: Point) -> int:
+        """Return the square of this area's distance from a point.
+
+        This avoids building any intermediate objects or taking a square root, so
+        it's cheap enough to call for every node visited in a nearest-neighbour search.
+        """
+        x, y = point.x, point.y
+        dx = self._lower.x - x if x < self._lower.x else max(x - self._upper.x, 0)
+        dy = self._lower.y - y if y < self._lower.y else max(y - self._upper.y, 0)
+        return dx * dx + dy * dy
 
     def __iter__(self) -> Iterator[Point]:
         for y in range(self._lower.y, self._upper.y):
@@ -0,0 +1,121 @@
+from hypothesis import given, settings
+from hypothesis import strategies as st
+import pytest
+
+from .strategies import list_and_element
+from .test_tree import areas, points_in, trees_and_edits
+from grid import GridIndex
+from space import Area, Point
+from tree import Match, PartitionTree
+
+
+def parity(value):
+    return value % 2
+
+
+cell_sizes = st.integers(min_value=1, max_value=10)
+
+
+@st.composite
+def indexes(draw, min_size=0):
+    area = draw(areas(max_dimension=40))
+    points = draw(st.lists(points_in(area), min_size=min_size, unique=True))
+    positions = {point: draw(st.integers(0, 3)) for point in points}
+    index = GridIndex.build(area, parity, positions, cell_size=draw(cell_sizes))
+    return area, positions, index
+
+
+@given(indexes())
+def test_lookup(area_and_index):
+    area, positions, index = area_and_index
+
+    assert len(index) == len(positions)
+    assert dict(index.items()) == positions
+    for point, value in positions.items():
+        assert point in index
+        assert index[point] == value
+
+
+@given(indexes(), st.data())
+def test_empty_point(area_and_index, data):
+    area, positions, index = area_and_index
+    point = data.draw(points_in(area))
+    if point not in positions:
+        assert index.get(point) is None
+        with pytest.raises(KeyError):
+            index[point]
+
+
+@given(indexes(), areas(max_dimension=40))
+def test_items_in(area_and_index, inclusion_area):
+    area, positions, index = area_and_index
+
+    assert index.items_in(inclusion_area) == {
+        Match(p, v) for p, v in positions.items() if p in inclusion_area
+    }
+
+
+@given(indexes(min_size=1), st.data(), st.integers(min_value=0, max_value=12))
+@settings(max_examples=50)
+def test_nearest_k_matches_tree(area_and_index, data, k):
+    area, positions, index = area_and_index
+    origin = data.draw(st.sampled_from(sorted(positions, key=lambda p: (p.x, p.y))))
+    tree = PartitionTree.build(area, parity, positions)
+
+    for key in [0, 1]:
+        grid_nearest = index.nearest_k(origin, k, key)
+        tree_nearest = tree.nearest_k(origin, k, key)
+        assert grid_nearest == tree_nearest
+
+        nearest = index.nearest_to(origin, key)
+        expected = tree.nearest_to(origin, key)
+        if expected is None:
+            assert nearest is None
+        else:
+            assert nearest is not None
+            assert (nearest.point - origin).distance == (
+                expected.point - origin
+            ).distance
+
+
+@given(indexes(min_size=1), st.data(), st.floats(min_value=0, max_value=30))
+def test_within_matches_tree(area_and_index, data, radius):
+    area, positions, index = area_and_index
+    origin = data.draw(points_in(area))
+    tree = PartitionTree.build(area, parity, positions)
+
+    for key in [0, 1]:
+        assert index.within(origin, radius, key) == tree.within(origin, radius, key)
+
+
+@given(trees_and_edits(), cell_sizes)
+def test_apply_edits(tree_and_edits, cell_size):
+    area, positions, edits, expected = tree_and_edits
+    index = GridIndex.build(area, parity, positions, cell_size=cell_size)
+
+    for new_index in [index.apply(edits), index.mutable().apply(edits)]:
+        assert dict(new_index.items()) == expected
+        assert len(new_index) == len(expected)
+        for point, value in expected.items():
+            assert new_index[point] == value
+    assert dict(index.items()) == positions
+
+
+@given(trees_and_edits(), cell_sizes)
+def test_mutable_snapshot_is_unaffected_by_later_changes(tree_and_edits, cell_size):
+    area, positions, edits, expected = tree_and_edits
+    mutable = GridIndex.build(area, parity, positions, cell_size=cell_size).mutable()
+
+    snapshot = mutable.snapshot()
+    mutable.apply(edits)
+
+    assert dict(snapshot.items()) == positions
+    assert dict(mutable.items()) == expected
+
+
+def test_rejects_points_outside_area():
+    area = Area(Point(0, 0), Point(5, 5))
+    with pytest.raises(ValueError):
+        GridIndex.build(area, parity, {Point(5, 0): 1})
+    with pytest.raises(ValueError):
+        GridIndex.build(area, parity).set(Point(-1, 0), 1)
@@ -310,3 +310,62 @@ class TestChangeCharacter:
         paint = ChangeCharacter(instigator, Point(1, 1), paint_blue)
         new_roster = paint.next_roster(roster)
         assert new_roster.character_at(Point(0, 0)) is instigator
+
+
+class TestMutableRoster:
+    @given(position_dicts(min_size=1).flatmap(dict_and_element))
+    def test_changes_leave_original_alone(self, positions_and_item):
+        positions, (position, character) = positions_and_item
+        roster = Roster.for_mapping(positions, area_containing(positions))
+
+        mutable = roster.mutable()
+        changed = mutable.change_character(position, paint_blue)
+
+        assert changed is mutable
+        assert roster.character_at(position) is character
+        assert character in roster
+        assert mutable.character_at(position) is not character
+        assert character not in mutable
+
+    @given(position_dicts(min_size=1).flatmap(dict_and_element))
+    def test_snapshot_is_unaffected_by_later_changes(self, positions_and_item):
+        positions, (position, character) = positions_and_item
+        mutable = Roster.for_mapping(positions, area_containing(positions)).mutable()
+
+        snapshot = mutable.snapshot()
+        mutable.change_character(position, paint_blue)
+
+        assert snapshot.character_at(position) is character
+        assert character in snapshot
+        assert mutable.snapshot() != snapshot
+
+
+class TestNearbyQueries:
+    def test_viewpoint_nearest_k(self):
+        blues = {Point(x, 0): Character(colour="blue") for x in range(1, 6)}
+        positions = {Point(0, 0): Character(colour="red"), **blues}
+        roster = Roster.partitioned(
+            positions, area_containing(positions), partition_func=character_colour
+        )
+        viewpoint = Viewpoint(Point(0, 0), roster)
+
+        assert viewpoint.nearest_k(Vector.ZERO, 3, "blue") == [
+            Vector(1, 0),
+            Vector(2, 0),
+            Vector(3, 0),
+        ]
+        assert viewpoint.nearest_k(Vector.ZERO, 3, "red") == []
+
+    def test_viewpoint_within(self):
+        blues = {Point(x, 0): Character(colour="blue") for x in range(1, 6)}
+        positions = {Point(0, 0): Character(colour="red"), **blues}
+        roster = Roster.partitioned(
+            positions, area_containing(positions), partition_func=character_colour
+        )
+        viewpoint = Viewpoint(Point(0, 0), roster)
+
+        # The character at the query point itself isn't included
+        assert viewpoint.within(Vector(3, 0), 1.5, "blue") == [
+            Vector(2, 0),
+            Vector(4, 0),
+        ]
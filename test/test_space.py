@@ -296,6 +296,26 @@ class TestArea:
         intersection = reduce(lambda a, b: a.intersect(b), areas)
         assert point in intersection
 
+    @given(points_and_containing_areas(max_size=1))
+    def test_no_distance_from_contained_point(self, point_and_areas):
+        point, (area,) = point_and_areas
+        assert area.squared_distance_from(point) == 0
+        assert area.distance_from(point) == 0
+
+    @given(ordered_points(), points(bound=1000))
+    def test_squared_distance_is_a_lower_bound(self, bounds, point):
+        lower, upper = bounds
+        area = Area(lower, upper)
+        squared_distance = area.squared_distance_from(point)
+
+        assert isinstance(squared_distance, int)
+        assert math.isclose(area.distance_from(point) ** 2, squared_distance)
+        for corner in [lower, upper, Point(lower.x, upper.y), Point(upper.x, lower.y)]:
+            assert (
+                squared_distance
+                <= (corner.x - point.x) ** 2 + (corner.y - point.y) ** 2
+            )
+
 
 class TestVector:
     def test_no_arg_constructor(self):
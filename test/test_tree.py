@@ -1,12 +1,15 @@
-from hypothesis import example, given, note, settings
+from hypothesis import assume, example, given, note, settings
 from hypothesis import strategies as st
 from .strategies import list_and_element
+import math
+import pickle
 import pytest
 
-from typing import Any, Tuple
+from typing import Any, List, Tuple
 
 from space import Area, Point
-from tree import Match, PartitionTree, SpaceTree
+from tree import Edit, Leaf, Match, MoveEdit, MutableSpaceTree, PartitionTree, SetEdit
+from tree import SpaceTree, SplitNode, UnsetEdit
 
 Unit = Tuple[()]
 
@@ -60,6 +63,40 @@ def test_tree_item(area_and_point):
     assert tree[point] is value
 
 
+@given(areas().flatmap(lambda a: st.tuples(st.just(a), st.lists(points_in(a)))))
+def test_build_matches_incremental_set(area_and_points):
+    area, points = area_and_points
+    positions = {point: object() for point in points}
+
+    built = SpaceTree.build(area, positions)
+    incremental: SpaceTree[object] = SpaceTree.build(area)
+    for point, value in positions.items():
+        incremental = incremental.set(point, value)
+
+    assert len(built) == len(positions)
+    assert dict(built.items()) == dict(incremental.items())
+    for point, value in positions.items():
+        assert built[point] is value
+
+
+def _depth(node):
+    if isinstance(node, SplitNode):
+        return 1 + max(_depth(node._lower_child), _depth(node._upper_child))
+    return 0
+
+
+def test_build_is_balanced_for_clumped_points():
+    # A tight clump in one corner of a large area makes midpoint bisection recurse
+    # many times before it reaches the points themselves
+    area = Area(Point(0, 0), Point(1 << 20, 1 << 20))
+    positions = {Point(x, y): object() for x in range(32) for y in range(32)}
+
+    tree = SpaceTree.build(area, positions)
+
+    assert _depth(tree._root) <= math.ceil(math.log2(len(positions) / Leaf.LEAF_MAX))
+    assert dict(tree.items()) == positions
+
+
 @given(areas().flatmap(lambda a: st.tuples(st.just(a), points_in(a))))
 def test_no_nearest(area_and_point):
     area, point = area_and_point
@@ -234,3 +271,207 @@ def test_partition_items_in(area_and_points, inclusion_area):
             assert Match(point, character) in matches_in_area
         else:
             assert Match(point, character) not in matches_in_area
+
+
+@given(
+    areas().flatmap(
+        lambda a: st.tuples(
+            st.just(a),
+            st.lists(points_in(a), unique=True),
+            st.lists(points_in(a), unique=True),
+        )
+    )
+)
+def test_mutable_tree_leaves_original_alone(area_and_points):
+    area, points, new_points = area_and_points
+    positions = {point: object() for point in points}
+    tree = SpaceTree.build(area, positions)
+
+    mutable = tree.mutable()
+    for point in points:
+        mutable.unset(point)
+    for point in new_points:
+        mutable.set(point, point)
+
+    assert dict(tree.items()) == positions
+    assert dict(mutable.items()) == {point: point for point in new_points}
+
+
+@given(
+    areas().flatmap(
+        lambda a: st.tuples(
+            st.just(a),
+            st.lists(points_in(a), unique=True),
+            st.lists(points_in(a), unique=True),
+        )
+    )
+)
+def test_mutable_tree_snapshot_is_unaffected_by_later_changes(area_and_points):
+    area, points, new_points = area_and_points
+    mutable: MutableSpaceTree[Point] = SpaceTree.build(area).mutable()
+    for point in points:
+        mutable.set(point, point)
+
+    snapshot = mutable.snapshot()
+    for point in points:
+        mutable.unset(point)
+    for point in new_points:
+        mutable.set(point, point)
+
+    assert dict(snapshot.items()) == {point: point for point in points}
+    assert dict(mutable.items()) == {point: point for point in new_points}
+
+
+@given(areas().flatmap(lambda a: st.tuples(st.just(a), st.lists(points_in(a)))))
+def test_mutable_partition_tree_snapshot(area_and_points):
+    area, points = area_and_points
+    tree: PartitionTree[bool, Point] = PartitionTree.build(
+        area=area, partition_func=lambda point: point.x % 2 == 0
+    )
+
+    mutable = tree.mutable()
+    for point in points:
+        mutable.set(point, point)
+    snapshot = mutable.snapshot()
+
+    assert len(tree) == 0
+    assert dict(snapshot.items()) == {point: point for point in points}
+
+
+@st.composite
+def trees_and_edits(draw):
+    area = draw(areas(max_dimension=20))
+    positions = {
+        point: draw(st.integers(0, 3))
+        for point in draw(st.lists(points_in(area), unique=True))
+    }
+
+    expected = dict(positions)
+    edits: List[Edit[int]] = []
+    for _ in range(draw(st.integers(0, 30))):
+        kind = draw(st.sampled_from(["set", "unset", "move"]))
+        if kind == "set" or not expected:
+            point = draw(points_in(area))
+            value = draw(st.integers(0, 3))
+            edits.append(SetEdit(point, value))
+            expected[point] = value
+        elif kind == "unset":
+            point = draw(st.sampled_from(sorted(expected, key=lambda p: (p.x, p.y))))
+            edits.append(UnsetEdit(point))
+            del expected[point]
+        else:
+            old = draw(st.sampled_from(sorted(expected, key=lambda p: (p.x, p.y))))
+            new = draw(points_in(area))
+            edits.append(MoveEdit(old, new))
+            expected[new] = expected.pop(old)
+
+    return area, positions, edits, expected
+
+
+@given(trees_and_edits())
+def test_apply_edits(tree_and_edits):
+    area, positions, edits, expected = tree_and_edits
+    tree = SpaceTree.build(area, positions)
+
+    assert dict(tree.apply(edits).items()) == expected
+    assert dict(tree.mutable().apply(edits).items()) == expected
+    assert dict(tree.items()) == positions
+
+
+@given(trees_and_edits())
+def test_partition_tree_apply_edits(tree_and_edits):
+    area, positions, edits, expected = tree_and_edits
+    tree = PartitionTree.build(area, lambda value: value % 2, positions)
+
+    for new_tree in [tree.apply(edits), tree.mutable().apply(edits)]:
+        assert dict(new_tree.items()) == expected
+        assert len(new_tree) == len(expected)
+        for point, value in expected.items():
+            assert new_tree[point] == value
+    assert dict(tree.items()) == positions
+
+
+@given(areas().flatmap(lambda a: st.tuples(st.just(a), st.lists(points_in(a)))))
+def test_apply_unset_of_empty_point(area_and_points):
+    area, points = area_and_points
+    positions = {point: object() for point in points}
+    tree = SpaceTree.build(area, positions)
+    empty_point = next((p for p in area if p not in positions), None)
+    assume(empty_point is not None)
+    assert empty_point is not None
+
+    with pytest.raises(KeyError):
+        tree.apply([UnsetEdit(empty_point)])
+
+
+@given(
+    areas(max_dimension=50).flatmap(
+        lambda a: st.tuples(
+            st.just(a),
+            st.lists(points_in(a), min_size=1, unique=True).flatmap(list_and_element),
+            st.integers(min_value=0, max_value=15),
+        )
+    )
+)
+def test_nearest_k(area_points_and_k):
+    area, (points, origin), k = area_points_and_k
+    tree = SpaceTree.build(area=area, positions={point: point for point in points})
+
+    nearest = tree.nearest_k(origin, k)
+
+    distances = sorted((p - origin).distance for p in points if p != origin)
+    assert [(m.point - origin).distance for m in nearest] == distances[:k]
+    assert all(m.point == m.value for m in nearest)
+    assert origin not in [m.point for m in nearest]
+
+
+@given(
+    areas(max_dimension=50).flatmap(
+        lambda a: st.tuples(
+            st.just(a),
+            st.lists(points_in(a), min_size=1, unique=True).flatmap(list_and_element),
+            st.floats(min_value=0, max_value=50),
+        )
+    )
+)
+def test_within(area_points_and_radius):
+    area, (points, origin), radius = area_points_and_radius
+    tree = SpaceTree.build(area=area, positions={point: point for point in points})
+
+    nearby = tree.within(origin, radius)
+
+    expected = {p for p in points if p != origin and (p - origin).distance <= radius}
+    assert {m.point for m in nearby} == expected
+    distances = [(m.point - origin).distance for m in nearby]
+    assert distances == sorted(distances)
+
+
+@given(areas().flatmap(lambda a: st.tuples(st.just(a), points_in(a))))
+def test_partition_tree_nearest_k_missing_key(area_and_point):
+    area, point = area_and_point
+    tree = PartitionTree.build(
+        area=area, partition_func=lambda item: 1, positions={point: object()}
+    )
+
+    assert tree.nearest_k(point, 3, key=2) == []
+    assert tree.within(point, 10, key=2) == []
+
+
+@given(areas().flatmap(lambda a: st.tuples(st.just(a), st.lists(points_in(a)))))
+def test_tree_pickles(area_and_points):
+    area, points = area_and_points
+    tree = SpaceTree.build(area, {point: (point.x, point.y) for point in points})
+
+    unpickled = pickle.loads(pickle.dumps(tree))
+
+    assert unpickled == tree
+    assert dict(unpickled.items()) == dict(tree.items())
+
+
+def test_split_nodes_compare_structurally():
+    area = Area(Point(0, 0), Point(100, 100))
+    positions = {Point(x, x): x for x in range(50)}
+
+    tree = SpaceTree.build(area, positions)
+    assert isinstance(tree._root, SplitNode)
+    assert tree == SpaceTree.build(area, dict(positions))
@@ -1,4 +1,6 @@
 import attr
+from bisect import bisect_left, bisect_right
+from heapq import heappush, heapreplace
 from enum import Enum
 from itertools import chain
 import math
@@ -8,7 +10,10 @@ from typing import (
     Generic,
     Hashable,
     Iterable,
+    List,
+    Mapping,
     Optional,
+    Protocol,
     Set,
     TypeVar,
     Tuple,
@@ -19,7 +24,10 @@ from space import Area, Point
 
 ValueType = TypeVar("ValueType")
 PartitionKeyType = TypeVar("PartitionKeyType", bound=Hashable)
-LowerFunc = Callable[[Point], bool]
+
+# Split nodes divide their area along one of these axes
+X_AXIS = 0
+Y_AXIS = 1
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -29,26 +37,143 @@ class Match(Generic[ValueType]):
 
 
 @attr.s(auto_attribs=True, frozen=True)
-class PartitionTree(Generic[PartitionKeyType, ValueType]):
-    @classmethod
-    def build(
-        cls,
-        area: Area,
-        partition_func: Callable[[ValueType], PartitionKeyType],
-        positions: Optional[Dict[Point, ValueType]] = None,
-    ) -> "PartitionTree[PartitionKeyType, ValueType]":
-        tree: "PartitionTree[PartitionKeyType, ValueType]" = PartitionTree(
-            area, partition_func, {}
-        )
-        if positions:
-            for point, value in positions.items():
-                tree = tree.set(point, value)
+class SetEdit(Generic[ValueType]):
+    point: Point
+    value: ValueType
 
-        return tree
 
-    _area: Area
+@attr.s(auto_attribs=True, frozen=True)
+class UnsetEdit:
+    point: Point
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class MoveEdit:
+    old_point: Point
+    new_point: Point
+
+
+Edit = Union[SetEdit[ValueType], UnsetEdit, MoveEdit]
+
+
+class Unset:
+    """Marks a point that a batch of edits leaves empty."""
+
+    def __repr__(self) -> str:
+        return "UNSET"
+
+
+UNSET = Unset()
+
+# The overall effect of a batch of edits on a single point
+Change = Union[ValueType, Unset]
+
+
+def net_changes(
+    edits: Iterable[Edit[ValueType]], lookup: Callable[[Point], Optional[ValueType]]
+) -> Dict[Point, Change[ValueType]]:
+    """Reduce a sequence of edits to the overall change they make to each point.
+
+    Edits take effect in order, so setting a point and then unsetting it again has no
+    overall effect (unless the point was set to begin with). Unsetting or moving from
+    an empty point raises a KeyError, without any of the edits taking effect.
+    """
+    changes: Dict[Point, Change[ValueType]] = {}
+
+    def current_value(point: Point) -> ValueType:
+        value = changes[point] if point in changes else lookup(point)
+        if value is None or isinstance(value, Unset):
+            raise KeyError(point)
+        return value
+
+    def unset(point: Point) -> None:
+        current_value(point)
+        if point in changes and lookup(point) is None:
+            del changes[point]
+        else:
+            changes[point] = UNSET
+
+    for edit in edits:
+        if isinstance(edit, SetEdit):
+            changes[edit.point] = edit.value
+        elif isinstance(edit, UnsetEdit):
+            unset(edit.point)
+        else:
+            value = current_value(edit.old_point)
+            unset(edit.old_point)
+            changes[edit.new_point] = value
+
+    return changes
+
+
+IndexKeyType = TypeVar("IndexKeyType", bound=Hashable, contravariant=True)
+
+
+class SpatialIndex(Protocol[IndexKeyType, ValueType]):
+    """The interface that a Roster needs from its underlying positional index."""
+
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, position: Point) -> bool:
+        ...
+
+    def __getitem__(self, position: Point) -> ValueType:
+        ...
+
+    def get(self, position: Point) -> Optional[ValueType]:
+        ...
+
+    def items(self) -> Iterable[Tuple[Point, ValueType]]:
+        ...
+
+    def items_in(self, area: Area) -> Set[Match[ValueType]]:
+        ...
+
+    def nearest_to(
+        self, origin: Point, key: IndexKeyType
+    ) -> Optional[Match[ValueType]]:
+        ...
+
+    def nearest_k(
+        self, origin: Point, k: int, key: IndexKeyType
+    ) -> List[Match[ValueType]]:
+        ...
+
+    def within(
+        self, origin: Point, radius: float, key: IndexKeyType
+    ) -> List[Match[ValueType]]:
+        ...
+
+    def set(
+        self, position: Point, value: ValueType
+    ) -> "SpatialIndex[IndexKeyType, ValueType]":
+        ...
+
+    def unset(self, position: Point) -> "SpatialIndex[IndexKeyType, ValueType]":
+        ...
+
+    def apply(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> "SpatialIndex[IndexKeyType, ValueType]":
+        ...
+
+    def mutable(self) -> "MutableSpatialIndex[IndexKeyType, ValueType]":
+        ...
+
+
+class MutableSpatialIndex(SpatialIndex[IndexKeyType, ValueType], Protocol):
+    """A SpatialIndex whose `set` and `unset` methods update it in place."""
+
+    def snapshot(self) -> SpatialIndex[IndexKeyType, ValueType]:
+        ...
+
+
+class _Partitioned(Generic[PartitionKeyType, ValueType]):
+    """Read-only operations shared by PartitionTree and MutablePartitionTree."""
+
     _partition_func: Callable[[ValueType], PartitionKeyType]
-    _trees: Dict[PartitionKeyType, "SpaceTree[ValueType]"]
+    _trees: Mapping[PartitionKeyType, "SpaceTree[ValueType]"]
 
     def __len__(self) -> int:
         return sum(len(t) for t in self._trees.values())
@@ -90,6 +215,78 @@ class PartitionTree(Generic[PartitionKeyType, ValueType]):
 
         return tree.nearest_to(origin)
 
+    def nearest_k(
+        self, origin: Point, k: int, key: PartitionKeyType
+    ) -> List[Match[ValueType]]:
+        try:
+            tree = self._trees[key]
+        except KeyError:
+            return []
+
+        return tree.nearest_k(origin, k)
+
+    def within(
+        self, origin: Point, radius: float, key: PartitionKeyType
+    ) -> List[Match[ValueType]]:
+        try:
+            tree = self._trees[key]
+        except KeyError:
+            return []
+
+        return tree.within(origin, radius)
+
+    def _changes_by_key(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> Dict[PartitionKeyType, Dict[Point, Change[ValueType]]]:
+        """Work out the changes that a batch of edits makes to each partition.
+
+        A value that moves between partitions is unset from its old partition's tree
+        and set in its new one.
+        """
+        changes_by_key: Dict[PartitionKeyType, Dict[Point, Change[ValueType]]] = {}
+        for point, change in net_changes(edits, self.get).items():
+            old_key = self._key_at(point)
+            new_key = (
+                None if isinstance(change, Unset) else self._partition_func(change)
+            )
+            if old_key is not None and old_key != new_key:
+                changes_by_key.setdefault(old_key, {})[point] = UNSET
+            if new_key is not None:
+                changes_by_key.setdefault(new_key, {})[point] = change
+        return changes_by_key
+
+    def _key_at(self, position: Point) -> Optional[PartitionKeyType]:
+        for key, tree in self._trees.items():
+            if position in tree:
+                return key
+        else:
+            return None
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class PartitionTree(_Partitioned[PartitionKeyType, ValueType]):
+    @classmethod
+    def build(
+        cls,
+        area: Area,
+        partition_func: Callable[[ValueType], PartitionKeyType],
+        positions: Optional[Dict[Point, ValueType]] = None,
+    ) -> "PartitionTree[PartitionKeyType, ValueType]":
+        partitions: Dict[PartitionKeyType, Dict[Point, ValueType]] = {}
+        if positions:
+            for point, value in positions.items():
+                partitions.setdefault(partition_func(value), {})[point] = value
+
+        trees = {
+            key: SpaceTree.build(area, key_positions)
+            for key, key_positions in partitions.items()
+        }
+        return PartitionTree(area, partition_func, trees)
+
+    _area: Area
+    _partition_func: Callable[[ValueType], PartitionKeyType]
+    _trees: Dict[PartitionKeyType, "SpaceTree[ValueType]"]
+
     def set(
         self, position: Point, character: ValueType
     ) -> "PartitionTree[PartitionKeyType, ValueType]":
@@ -109,6 +306,85 @@ class PartitionTree(Generic[PartitionKeyType, ValueType]):
         else:
             raise KeyError(position)
 
+    def apply(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> "PartitionTree[PartitionKeyType, ValueType]":
+        """Return a new PartitionTree with a batch of edits applied.
+
+        Each partition's tree is rebuilt once for the whole batch, rather than once
+        for each edit.
+        """
+        changes_by_key = self._changes_by_key(edits)
+        if not changes_by_key:
+            return self
+
+        new_trees = self._trees.copy()
+        for key, changes in changes_by_key.items():
+            key_tree = new_trees.get(key, SpaceTree.build(self._area))
+            new_trees[key] = key_tree._apply_changes(changes)
+
+        return PartitionTree(self._area, self._partition_func, new_trees)
+
+    def mutable(self) -> "MutablePartitionTree[PartitionKeyType, ValueType]":
+        return MutablePartitionTree(self._area, self._partition_func, self._trees)
+
+
+class MutablePartitionTree(_Partitioned[PartitionKeyType, ValueType]):
+    """A PartitionTree that updates itself in place.
+
+    This shares its initial structure with the PartitionTree it was created from, and
+    only copies nodes the first time it changes them; after that, further changes to
+    the same nodes happen in place. Call `snapshot` to get an immutable PartitionTree
+    of the current state.
+    """
+
+    def __init__(
+        self,
+        area: Area,
+        partition_func: Callable[[ValueType], PartitionKeyType],
+        trees: Mapping[PartitionKeyType, "SpaceTree[ValueType]"],
+    ):
+        self._area = area
+        self._partition_func = partition_func
+        self._trees: Dict[PartitionKeyType, MutableSpaceTree[ValueType]] = {
+            key: tree.mutable() for key, tree in trees.items()
+        }
+
+    def set(
+        self, position: Point, character: ValueType
+    ) -> "MutablePartitionTree[PartitionKeyType, ValueType]":
+        char_key = self._partition_func(character)
+        if char_key not in self._trees:
+            self._trees[char_key] = SpaceTree.build(self._area).mutable()
+        self._trees[char_key].set(position, character)
+        return self
+
+    def unset(
+        self, position: Point
+    ) -> "MutablePartitionTree[PartitionKeyType, ValueType]":
+        for tree in self._trees.values():
+            if position in tree:
+                tree.unset(position)
+                return self
+        else:
+            raise KeyError(position)
+
+    def apply(
+        self, edits: Iterable[Edit[ValueType]]
+    ) -> "MutablePartitionTree[PartitionKeyType, ValueType]":
+        for key, changes in self._changes_by_key(edits).items():
+            if key not in self._trees:
+                self._trees[key] = SpaceTree.build(self._area).mutable()
+            self._trees[key]._apply_changes(changes)
+        return self
+
+    def mutable(self) -> "MutablePartitionTree[PartitionKeyType, ValueType]":
+        return self.snapshot().mutable()
+
+    def snapshot(self) -> PartitionTree[PartitionKeyType, ValueType]:
+        trees = {key: tree.snapshot() for key, tree in self._trees.items()}
+        return PartitionTree(self._area, self._partition_func, trees)
+
 
 class SpaceTree(Generic[ValueType]):
     """A dict-like structure that maps 2-dimensional positions to values.
@@ -121,10 +397,11 @@ class SpaceTree(Generic[ValueType]):
         ... )
 
     This data structure is roughly based on a `k-d tree`_, with a couple of fudges along
-    the way. For instance, it currently bisects nodes straight down the middle along
-    their longest axis, rather than finding a median point. This isn't likely to be
-    optimal, especially given that characters are likely to "clump" together, but it'll
-    do for the moment.
+    the way. Building a tree in one go splits nodes at the median point along their
+    longest axis, which gives a balanced tree however the entries are distributed.
+    Adding entries one by one, however, bisects full leaves straight down the middle.
+    This isn't likely to be optimal, especially given that characters are likely to
+    "clump" together, but it'll do for the moment.
 
     .. _k-d tree: https://en.wikipedia.org/wiki/K-d_tree
 
@@ -134,13 +411,15 @@ class SpaceTree(Generic[ValueType]):
     def build(
         self, area: Area, positions: Optional[Dict[Point, ValueType]] = None
     ) -> "SpaceTree[ValueType]":
-        """Build and return a new SpaceTree with the given area and entries."""
-        tree: "SpaceTree[ValueType]" = SpaceTree(area, Leaf(area))
-        if positions:
-            for point, value in positions.items():
-                tree = tree.set(point, value)
+        """Build and return a new SpaceTree with the given area and entries.
+
+        Rather than adding entries one at a time, this sorts them once along each axis
+        and bulk-loads a balanced tree from the sorted lists.
+        """
+        if not positions:
+            return SpaceTree(area, Leaf(area))
 
-        return tree
+        return SpaceTree(area, _build_node(area, positions))
 
     def __init__(self, area: Area, root: "Node[ValueType]"):
         self._area = area
@@ -190,22 +469,130 @@ class SpaceTree(Generic[ValueType]):
         """
         return SpaceTree(self._area, self._root.unset(point))
 
+    def apply(self, edits: Iterable[Edit[ValueType]]) -> "SpaceTree[ValueType]":
+        """Return a new SpaceTree, with a batch of edits applied in order.
+
+        Each node is rebuilt at most once for the whole batch, rather than once for
+        each edit. If an edit unsets or moves from an empty point, raise a KeyError.
+        """
+        changes = net_changes(edits, self.get)
+        return self._apply_changes(changes)
+
+    def _apply_changes(
+        self, changes: Mapping[Point, Change[ValueType]]
+    ) -> "SpaceTree[ValueType]":
+        if not changes:
+            return self
+        return SpaceTree(self._area, self._root.apply(list(changes.items())))
+
     def nearest_to(self, origin: Point) -> Optional[Match[ValueType]]:
         """Return the nearest entry to a given point, not including the point itself."""
-        return self._root.nearest_to(origin)
+        nearest = self._root.nearest(origin)
+        if nearest is None:
+            return None
+        _, point, value = nearest
+        return Match(point, value)
+
+    def nearest_k(self, origin: Point, k: int) -> List[Match[ValueType]]:
+        """Return the `k` nearest entries to a given point, nearest first.
+
+        As with `nearest_to`, this doesn't include any entry at the point itself. If
+        there are fewer than `k` other entries, return all of them.
+        """
+        nearest: List[Candidate[ValueType]] = []
+        if k > 0:
+            self._root.nearest_k(origin, k, nearest)
+        nearest.sort(key=lambda c: (-c[0], c[1], c[2]))
+        return [Match(point, value) for _, _, _, point, value in nearest]
+
+    def within(self, origin: Point, radius: float) -> List[Match[ValueType]]:
+        """Return every entry within `radius` of a given point, nearest first.
+
+        As with `nearest_to`, this doesn't include any entry at the point itself.
+        """
+        if radius < 0:
+            return []
+        nearby = sorted(
+            self._root.within(origin, radius * radius),
+            key=lambda n: (n[0], n[1].x, n[1].y),
+        )
+        return [Match(point, value) for _, point, value in nearby]
 
     def items_in(self, area: Area) -> Set[Match[ValueType]]:
         return set(self._root.items_in(area))
 
+    def mutable(self) -> "MutableSpaceTree[ValueType]":
+        """Return a MutableSpaceTree starting out with the same entries as this one."""
+        return MutableSpaceTree(self._area, self._root)
+
+
+class MutableSpaceTree(SpaceTree[ValueType]):
+    """A SpaceTree whose `set` and `unset` methods change it in place.
+
+    Nodes are tagged with the tree that owns them. Changing a node owned by some other
+    tree makes an owned copy of it first, so any SpaceTree this one was created from or
+    has taken a snapshot of is left untouched, but nodes owned by this tree can be
+    changed without copying them again.
+    """
+
+    def __init__(self, area: Area, root: "Node[ValueType]"):
+        super().__init__(area, root)
+        self._owner = object()
+
+    def __repr__(self) -> str:
+        return f"MutableSpaceTree({self._area}, {self._root})"
+
+    def set(self, point: Point, value: ValueType) -> "MutableSpaceTree[ValueType]":
+        """Add a value at the given point, replacing any that's already there."""
+        self._root = self._root.set(point, value, self._owner)
+        return self
+
+    def unset(self, point: Point) -> "MutableSpaceTree[ValueType]":
+        """Unset the given point, raising a KeyError if there's no value there."""
+        self._root = self._root.unset(point, self._owner)
+        return self
+
+    def apply(self, edits: Iterable[Edit[ValueType]]) -> "MutableSpaceTree[ValueType]":
+        """Apply a batch of edits in order, changing each node at most once."""
+        changes = net_changes(edits, self.get)
+        return self._apply_changes(changes)
+
+    def _apply_changes(
+        self, changes: Mapping[Point, Change[ValueType]]
+    ) -> "MutableSpaceTree[ValueType]":
+        if changes:
+            self._root = self._root.apply(list(changes.items()), self._owner)
+        return self
+
+    def snapshot(self) -> SpaceTree[ValueType]:
+        """Return an immutable SpaceTree with this tree's current entries.
+
+        This takes constant time: rather than copying anything now, this tree gives up
+        ownership of all its current nodes, so it will copy them if it changes later.
+        """
+        self._owner = object()
+        return SpaceTree(self._area, self._root)
+
 
 class Leaf(Generic[ValueType]):
     """Helper class for SpaceTree, representing a node that hasn't been split."""
 
     LEAF_MAX = 10
 
-    def __init__(self, area: Area, positions: Optional[Dict[Point, ValueType]] = None):
+    __slots__ = ("_area", "_positions", "_owner")
+
+    def __init__(
+        self,
+        area: Area,
+        positions: Optional[Dict[Point, ValueType]] = None,
+        owner: Optional[object] = None,
+    ):
         self._area = area
         self._positions = positions or {}
+        self._owner = owner
+
+    def __repr__(self) -> str:
+        return f"Leaf({self._area}, {self._positions})"
 
     def __getitem__(self, point: Point) -> ValueType:
         if point not in self._area:
@@ -231,86 +618,176 @@ class Leaf(Generic[ValueType]):
             Match(pos, item) for pos, item in self._positions.items() if pos in area
         )
 
-    def _split(self) -> Tuple[Area, Area, LowerFunc]:
+    def _split(self) -> Tuple[int, int]:
+        lower, upper = self._area._lower, self._area._upper
         if self._area.width >= self._area.height:
             # Split horizontally
-            midpoint_x = (self._area._lower.x + self._area._upper.x) // 2
-            lower_area = Area(self._area._lower, Point(midpoint_x, self._area._upper.y))
-            upper_area = Area(Point(midpoint_x, self._area._lower.y), self._area._upper)
-            lower_func = lambda point: point.x < midpoint_x
-
-            return (lower_area, upper_area, lower_func)
+            return (X_AXIS, (lower.x + upper.x) // 2)
         else:
             # Split vertically
-            midpoint_y = (self._area._lower.y + self._area._upper.y) // 2
-            lower_area = Area(self._area._lower, Point(self._area._upper.x, midpoint_y))
-            upper_area = Area(Point(self._area._lower.x, midpoint_y), self._area._upper)
-            lower_func = lambda point: point.y < midpoint_y
+            return (Y_AXIS, (lower.y + upper.y) // 2)
 
-            return (lower_area, upper_area, lower_func)
+    def _owned(self, owner: Optional[object]) -> "Leaf[ValueType]":
+        if owner is not None and self._owner is owner:
+            return self
+        return Leaf(self._area, self._positions.copy(), owner)
 
-    def set(self, point: Point, value: ValueType) -> "Node[ValueType]":
-        if point not in self._positions and len(self._positions) >= self.LEAF_MAX:
-            lower_area, upper_area, lower_func = self._split()
-
-            lower_child = Leaf(
-                lower_area, {p: v for p, v in self.items() if lower_func(p)}
-            )
+    def set(
+        self, point: Point, value: ValueType, owner: Optional[object] = None
+    ) -> "Node[ValueType]":
+        """Set a value in this node, returning the resulting node.
 
-            upper_child = Leaf(
-                upper_area,
-                {p: v for p, v in self.items() if not lower_func(p)},
+        If `owner` is given and owns this node, change the node in place. Otherwise,
+        leave it alone and return a new node owned by `owner`.
+        """
+        if point not in self._positions and len(self._positions) >= self.LEAF_MAX:
+            axis, threshold = self._split()
+            lower_area, upper_area = _split_at(self._area, axis, threshold)
+            lower_positions, upper_positions = {}, {}
+            for p, v in self.items():
+                if (p.y if axis else p.x) < threshold:
+                    lower_positions[p] = v
+                else:
+                    upper_positions[p] = v
+
+            split_node = SplitNode(
+                self._area,
+                axis,
+                threshold,
+                Leaf(lower_area, lower_positions, owner),
+                Leaf(upper_area, upper_positions, owner),
+                owner,
             )
-
-            split_node = SplitNode(self._area, lower_func, lower_child, upper_child)
-            return split_node.set(point, value)
+            return split_node.set(point, value, owner)
         else:
-            new_positions = self._positions.copy()
-            new_positions[point] = value
-            return Leaf(self._area, new_positions)
-
-    def unset(self, point: Point) -> "Leaf[ValueType]":
-        new_positions = self._positions.copy()
-        del new_positions[point]
-        return Leaf(self._area, new_positions)
-
-    def nearest_to(
+            leaf = self._owned(owner)
+            leaf._positions[point] = value
+            return leaf
+
+    def unset(self, point: Point, owner: Optional[object] = None) -> "Leaf[ValueType]":
+        if point not in self._positions:
+            raise KeyError(point)
+        leaf = self._owned(owner)
+        del leaf._positions[point]
+        return leaf
+
+    def apply(
         self,
-        origin: Point,
-        max_distance: float = math.inf,
-    ) -> Optional[Match[ValueType]]:
-
-        if self._area.distance_from(origin) > max_distance:
+        changes: List[Tuple[Point, Change[ValueType]]],
+        owner: Optional[object] = None,
+    ) -> "Node[ValueType]":
+        for point, change in changes:
+            if isinstance(change, Unset) and point not in self._positions:
+                raise KeyError(point)
+
+        leaf = self._owned(owner)
+        for point, change in changes:
+            if isinstance(change, Unset):
+                del leaf._positions[point]
+            else:
+                leaf._positions[point] = change
+
+        if len(leaf._positions) > self.LEAF_MAX:
+            return _build_node(self._area, leaf._positions)
+        return leaf
+
+    def nearest(
+        self, origin: Point, max_distance: float = math.inf
+    ) -> "Optional[Nearest[ValueType]]":
+        """Find the nearest entry to a point, not including the point itself.
+
+        Distances here are all squared, so that they can be compared as integers
+        without taking any square roots. Only entries nearer than `max_distance` are
+        considered, and the winner is returned as a (distance, point, value) tuple.
+        """
+        if self._area.squared_distance_from(origin) > max_distance:
             return None
 
-        best_match = None
+        x, y = origin.x, origin.y
+        best = None
         for pos, value in self._positions.items():
-            if pos == origin:
-                continue
-            distance = (pos - origin).distance
-            if distance < max_distance:
+            dx = pos.x - x
+            dy = pos.y - y
+            distance = dx * dx + dy * dy
+            # A zero distance means this is the origin itself, which doesn't count
+            if distance < max_distance and distance:
                 max_distance = distance
-                best_match = Match(pos, value)
-        return best_match
+                best = (distance, pos, value)
+        return best
+
+    def nearest_k(
+        self, origin: Point, k: int, nearest: "List[Candidate[ValueType]]"
+    ) -> None:
+        if self._area.squared_distance_from(origin) > _kth_distance(nearest, k):
+            return
+
+        x, y = origin.x, origin.y
+        for pos, value in self._positions.items():
+            dx = pos.x - x
+            dy = pos.y - y
+            distance = dx * dx + dy * dy
+            if not distance:
+                continue
+            if len(nearest) < k:
+                heappush(nearest, (-distance, pos.x, pos.y, pos, value))
+            elif distance < -nearest[0][0]:
+                heapreplace(nearest, (-distance, pos.x, pos.y, pos, value))
+
+    def within(
+        self, origin: Point, max_distance: float
+    ) -> Iterable[Tuple[int, Point, ValueType]]:
+        if self._area.squared_distance_from(origin) > max_distance:
+            return
+
+        x, y = origin.x, origin.y
+        for pos, value in self._positions.items():
+            dx = pos.x - x
+            dy = pos.y - y
+            distance = dx * dx + dy * dy
+            if distance and distance <= max_distance:
+                yield (distance, pos, value)
 
 
 class SplitNode(Generic[ValueType]):
-    """Helper class for SpaceTree, representing a node that has been split into two."""
+    """Helper class for SpaceTree, representing a node that has been split into two.
+
+    The split is described purely as data: points whose co-ordinate along `axis` is
+    less than `threshold` belong to the lower child, and all others to the upper one.
+    """
+
+    __slots__ = (
+        "_area",
+        "_axis",
+        "_threshold",
+        "_lower_child",
+        "_upper_child",
+        "_owner",
+    )
 
     def __init__(
         self,
         area: Area,
-        lower_func: LowerFunc,
+        axis: int,
+        threshold: int,
         lower_child: "Node[ValueType]",
         upper_child: "Node[ValueType]",
+        owner: Optional[object] = None,
     ):
         self._area = area
-        self._lower_func = lower_func
+        self._axis = axis
+        self._threshold = threshold
         self._lower_child = lower_child
         self._upper_child = upper_child
+        self._owner = owner
+
+    def __repr__(self) -> str:
+        return (
+            f"SplitNode({self._area}, {self._axis}, {self._threshold}, "
+            f"{self._lower_child}, {self._upper_child})"
+        )
 
     def __getitem__(self, point: Point) -> ValueType:
-        if self._lower_func(point):
+        if (point.y if self._axis else point.x) < self._threshold:
             return self._lower_child[point]
         else:
             return self._upper_child[point]
@@ -319,14 +796,16 @@ class SplitNode(Generic[ValueType]):
         return len(self._lower_child) + len(self._upper_child)
 
     def __hash__(self) -> int:
-        return hash((self._lower_child, self._upper_child))
+        return hash((self._axis, self._threshold, self._lower_child, self._upper_child))
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, SplitNode):
             return False
 
         return (
-            self._lower_child == other._lower_child
+            self._axis == other._axis
+            and self._threshold == other._threshold
+            and self._lower_child == other._lower_child
             and self._upper_child == other._upper_child
         )
 
@@ -338,60 +817,207 @@ class SplitNode(Generic[ValueType]):
             return []
         return chain(self._lower_child.items_in(area), self._upper_child.items_in(area))
 
-    def set(self, point: Point, value: ValueType) -> "SplitNode[ValueType]":
-        if self._lower_func(point):
-            return SplitNode(
-                self._area,
-                self._lower_func,
-                self._lower_child.set(point, value),
-                self._upper_child,
-            )
+    def _owned(self, owner: Optional[object]) -> "SplitNode[ValueType]":
+        if owner is not None and self._owner is owner:
+            return self
+        return SplitNode(
+            self._area,
+            self._axis,
+            self._threshold,
+            self._lower_child,
+            self._upper_child,
+            owner,
+        )
+
+    def set(
+        self, point: Point, value: ValueType, owner: Optional[object] = None
+    ) -> "SplitNode[ValueType]":
+        node = self._owned(owner)
+        if (point.y if self._axis else point.x) < self._threshold:
+            node._lower_child = self._lower_child.set(point, value, owner)
         else:
-            return SplitNode(
-                self._area,
-                self._lower_func,
-                self._lower_child,
-                self._upper_child.set(point, value),
-            )
+            node._upper_child = self._upper_child.set(point, value, owner)
+        return node
 
-    def unset(self, point: Point) -> "Node[ValueType]":
-        if self._lower_func(point):
-            lower_child = self._lower_child.unset(point)
+    def unset(self, point: Point, owner: Optional[object] = None) -> "Node[ValueType]":
+        if (point.y if self._axis else point.x) < self._threshold:
+            lower_child = self._lower_child.unset(point, owner)
             upper_child = self._upper_child
         else:
             lower_child = self._lower_child
-            upper_child = self._upper_child.unset(point)
+            upper_child = self._upper_child.unset(point, owner)
 
         if len(lower_child) + len(upper_child) <= Leaf.LEAF_MAX:
             positions = {p: v for p, v in lower_child.items()}
             for p, v in upper_child.items():
                 positions[p] = v
-            return Leaf(self._area, positions)
+            return Leaf(self._area, positions, owner)
         else:
-            return SplitNode(self._area, self._lower_func, lower_child, upper_child)
+            node = self._owned(owner)
+            node._lower_child = lower_child
+            node._upper_child = upper_child
+            return node
 
-    def nearest_to(
+    def apply(
         self,
-        origin: Point,
-        max_distance: float = math.inf,
-    ) -> Optional[Match[ValueType]]:
+        changes: List[Tuple[Point, Change[ValueType]]],
+        owner: Optional[object] = None,
+    ) -> "Node[ValueType]":
+        lower_changes = []
+        upper_changes = []
+        for point, change in changes:
+            if (point.y if self._axis else point.x) < self._threshold:
+                lower_changes.append((point, change))
+            else:
+                upper_changes.append((point, change))
+
+        lower_child = self._lower_child
+        if lower_changes:
+            lower_child = lower_child.apply(lower_changes, owner)
+        upper_child = self._upper_child
+        if upper_changes:
+            upper_child = upper_child.apply(upper_changes, owner)
 
-        if self._area.distance_from(origin) > max_distance:
+        if len(lower_child) + len(upper_child) <= Leaf.LEAF_MAX:
+            positions = dict(chain(lower_child.items(), upper_child.items()))
+            return Leaf(self._area, positions, owner)
+        else:
+            node = self._owned(owner)
+            node._lower_child = lower_child
+            node._upper_child = upper_child
+            return node
+
+    def nearest(
+        self, origin: Point, max_distance: float = math.inf
+    ) -> "Optional[Nearest[ValueType]]":
+        if self._area.squared_distance_from(origin) > max_distance:
             return None
 
-        if self._lower_func(origin):
+        if (origin.y if self._axis else origin.x) < self._threshold:
             children = [self._lower_child, self._upper_child]
         else:
             children = [self._upper_child, self._lower_child]
 
-        best_match = None
+        best = None
         for child in children:
-            child_match = child.nearest_to(origin, max_distance)
-            if child_match is not None:
-                best_match = child_match
-                max_distance = (child_match.point - origin).distance
+            child_best = child.nearest(origin, max_distance)
+            if child_best is not None:
+                best = child_best
+                max_distance = child_best[0]
+
+        return best
+
+    def nearest_k(
+        self, origin: Point, k: int, nearest: "List[Candidate[ValueType]]"
+    ) -> None:
+        if self._area.squared_distance_from(origin) > _kth_distance(nearest, k):
+            return
+
+        if (origin.y if self._axis else origin.x) < self._threshold:
+            self._lower_child.nearest_k(origin, k, nearest)
+            self._upper_child.nearest_k(origin, k, nearest)
+        else:
+            self._upper_child.nearest_k(origin, k, nearest)
+            self._lower_child.nearest_k(origin, k, nearest)
 
-        return best_match
+    def within(
+        self, origin: Point, max_distance: float
+    ) -> Iterable[Tuple[int, Point, ValueType]]:
+        if self._area.squared_distance_from(origin) > max_distance:
+            return []
+        return chain(
+            self._lower_child.within(origin, max_distance),
+            self._upper_child.within(origin, max_distance),
+        )
 
 
 Node = Union[Leaf[ValueType], SplitNode[ValueType]]
+Entry = Tuple[Point, ValueType]
+
+# The result of a nearest-neighbour search: squared distance, point and value
+Nearest = Tuple[int, Point, ValueType]
+
+# A max-heap entry for k-nearest searches: negated squared distance, then the point's
+# co-ordinates to break ties without having to compare the values themselves
+Candidate = Tuple[int, int, int, Point, ValueType]
+
+
+def _kth_distance(nearest: List[Candidate[ValueType]], k: int) -> float:
+    return -nearest[0][0] if len(nearest) >= k else math.inf
+
+
+def _build_node(area: Area, positions: Dict[Point, ValueType]) -> "Node[ValueType]":
+    by_x = sorted(positions.items(), key=lambda item: (item[0].x, item[0].y))
+    by_y = sorted(positions.items(), key=lambda item: (item[0].y, item[0].x))
+    return _bulk_load(area, by_x, by_y)
+
+
+def _bulk_load(
+    area: Area, by_x: List[Entry[ValueType]], by_y: List[Entry[ValueType]]
+) -> "Node[ValueType]":
+    """Build a balanced node from the same entries sorted by x and by y.
+
+    Each split is made at the median entry along the node's longest axis, and both
+    sorted lists are partitioned in a single pass so that neither needs re-sorting.
+    """
+    if len(by_x) <= Leaf.LEAF_MAX:
+        return Leaf(area, dict(by_x))
+
+    if area.width >= area.height:
+        axes = [(by_x, by_y, X_AXIS), (by_y, by_x, Y_AXIS)]
+    else:
+        axes = [(by_y, by_x, Y_AXIS), (by_x, by_y, X_AXIS)]
+
+    for sorted_entries, other_entries, axis in axes:
+        coordinates = _coordinates(sorted_entries, axis)
+        threshold = coordinates[len(coordinates) // 2]
+        if threshold == coordinates[0]:
+            # Everything below the median shares a coordinate, so split just above it
+            upper_start = bisect_right(coordinates, threshold)
+            if upper_start == len(coordinates):
+                continue
+            threshold = coordinates[upper_start]
+        else:
+            upper_start = bisect_left(coordinates, threshold)
+
+        lower_area, upper_area = _split_at(area, axis, threshold)
+        other_coordinates = _coordinates(other_entries, axis)
+        lower_other = [
+            e for e, c in zip(other_entries, other_coordinates) if c < threshold
+        ]
+        upper_other = [
+            e for e, c in zip(other_entries, other_coordinates) if c >= threshold
+        ]
+        lower_sorted = sorted_entries[:upper_start]
+        upper_sorted = sorted_entries[upper_start:]
+
+        if axis == X_AXIS:
+            lower_child = _bulk_load(lower_area, lower_sorted, lower_other)
+            upper_child = _bulk_load(upper_area, upper_sorted, upper_other)
+        else:
+            lower_child = _bulk_load(lower_area, lower_other, lower_sorted)
+            upper_child = _bulk_load(upper_area, upper_other, upper_sorted)
+
+        return SplitNode(area, axis, threshold, lower_child, upper_child)
+
+    # Entries are unique points, so they can only all share both coordinates if
+    # there's just one of them, which we'll have already put in a leaf
+    raise AssertionError("Unable to split distinct points")
+
+
+def _coordinates(entries: List[Entry[ValueType]], axis: int) -> List[int]:
+    if axis == X_AXIS:
+        return [point.x for point, _ in entries]
+    else:
+        return [point.y for point, _ in entries]
+
+
+def _split_at(area: Area, axis: int, threshold: int) -> Tuple[Area, Area]:
+    lower, upper = area._lower, area._upper
+    if axis == X_AXIS:
+        lower_area = Area(lower, Point(threshold, upper.y))
+        upper_area = Area(Point(threshold, lower.y), upper)
+    else:
+        lower_area = Area(lower, Point(upper.x, threshold))
+        upper_area = Area(Point(lower.x, threshold), upper)
+    return (lower_area, upper_area)
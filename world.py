@@ -14,9 +14,10 @@ from typing import (
 
 from barriers import Barriers
 from character import Character, LifeState, State
-from roster import Roster, ChangeCharacter, Move, Viewpoint
+from roster import IndexBuilder, Roster, ChangeCharacter, Move, Viewpoint
 from space import Area, BoundingBox, Point, Vector
 import tracing
+from tree import PartitionTree
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -25,7 +26,9 @@ class Tick:
     barriers: Barriers = Barriers.NONE
 
     def next(self) -> Roster[Character, LifeState]:
-        roster = self.roster
+        # Each action builds on the last, so we can update a single roster in place
+        # rather than building a new one for every action
+        roster = self.roster.mutable()
         area = self.roster._area
 
         for (position, character) in self.roster.positions:
@@ -41,8 +44,8 @@ class Tick:
 
                 action: Action = character.next_action(viewpoint, limits, actions)
 
-                roster = action.next_roster(roster)
-        return roster
+                action.next_roster(roster)
+        return roster.snapshot()
 
 
 class Action(Protocol):
@@ -77,6 +80,7 @@ class Builder:
         area: Area,
         population: Iterable[Optional[Character]],
         barriers: Barriers = Barriers.NONE,
+        backend: IndexBuilder[Character, LifeState] = PartitionTree.build,
     ):
         character_positions = (p for p in area if not barriers.occupied(p))
 
@@ -87,7 +91,10 @@ class Builder:
         }
 
         self._roster = Roster.partitioned(
-            starting_positions, area=area, partition_func=LifeState.for_character
+            starting_positions,
+            area=area,
+            partition_func=LifeState.for_character,
+            backend=backend,
         )
 
     @property